@@ -2,9 +2,11 @@ from logging.config import fileConfig
 import logging
 
 from sqlalchemy import engine_from_config
+from sqlalchemy import inspect
 from sqlalchemy import pool
 
 from alembic import context
+from alembic.script import ScriptDirectory
 
 # Set up logger
 logger = logging.getLogger("alembic")
@@ -14,29 +16,45 @@ logger = logging.getLogger("alembic")
 config = context.config
 
 # Interpret the config file for Python logging.
-# This line sets up loggers basically.
-fileConfig(config.config_file_name)
+# Skip it for programmatic configs and when logging is already set up,
+# so repeated runs in one process don't rebuild the logging tree.
+if config.config_file_name and not logging.getLogger().handlers:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # Add your model's MetaData object here
 # for 'autogenerate' support
 import sys
 import os
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
 
-# Import directly from base.py to ensure consistency
-from app.db.base import Base
+# Import the models' metadata directly; it does not pull in app settings
+from app.db.models import Base
 target_metadata = Base.metadata
 
-# Get database URL from settings
-from app.core.config import settings
+alembic_dir = os.path.dirname(os.path.abspath(__file__))
+if alembic_dir not in sys.path:
+    sys.path.insert(0, alembic_dir)
+from squashed_baseline_2024 import BASELINE_REVISION, create_schema
 
-# Use the same database_url processing as in base.py for consistency
-database_url = settings.DATABASE_URL
-if database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-    logger.info("Changed database URL dialect from 'postgres' to 'postgresql'")
 
-config.set_main_option("sqlalchemy.url", database_url)
+def _normalize_database_url(url):
+    """Use the 'postgresql' dialect name SQLAlchemy expects."""
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+        logger.info("Changed database URL dialect from 'postgres' to 'postgresql'")
+    return url
+
+
+def get_online_database_url():
+    """Resolve the database URL from the application settings."""
+    # Imported lazily so offline runs skip the settings validation pass
+    from app.core.config import settings
+
+    database_url = _normalize_database_url(settings.DATABASE_URL)
+    config.set_main_option("sqlalchemy.url", database_url)
+    return database_url
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -44,6 +62,39 @@ config.set_main_option("sqlalchemy.url", database_url)
 # ... etc.
 
 
+def _should_bootstrap():
+    """True when this run may create an empty database from the baseline.
+
+    `alembic upgrade` on the command line always may. Programmatic callers
+    such as command.upgrade(cfg, "head") have no cmd_opts, so they opt in
+    with cfg.attributes["bootstrap_baseline"] = True or
+    `-x bootstrap_baseline=true`.
+    """
+    if config.attributes.get("bootstrap_baseline"):
+        return True
+    x_args = context.get_x_argument(as_dictionary=True)
+    if x_args.get("bootstrap_baseline", "").lower() in ("1", "true", "yes"):
+        return True
+    cmd = getattr(config.cmd_opts, "cmd", None)
+    return bool(cmd) and cmd[0].__name__ == "upgrade"
+
+
+def _bootstrap_empty_database(connection):
+    """Create a fresh database from the squashed baseline.
+
+    Databases without an alembic_version table or any app tables get the
+    baseline schema and are stamped at BASELINE_REVISION, so only newer
+    revisions are replayed. Existing databases are left to the normal chain.
+    """
+    tables = set(inspect(connection).get_table_names())
+    if "alembic_version" in tables or "users" in tables:
+        return
+
+    logger.info(f"Empty database, creating squashed baseline at {BASELINE_REVISION}")
+    create_schema(connection)
+    context.get_context().stamp(ScriptDirectory.from_config(config), BASELINE_REVISION)
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -56,7 +107,9 @@ def run_migrations_offline():
     script output.
 
     """
-    url = config.get_main_option("sqlalchemy.url")
+    url = _normalize_database_url(
+        os.environ.get("DATABASE_URL") or config.get_main_option("sqlalchemy.url")
+    )
     context.configure(
         url=url,
         target_metadata=target_metadata,
@@ -76,7 +129,8 @@ def run_migrations_online():
 
     """
     try:
-        # Get the section and create an engine
+        # Resolve the URL from settings, then create an engine from the section
+        get_online_database_url()
         connectable = engine_from_config(
             config.get_section(config.config_ini_section),
             prefix="sqlalchemy.",
@@ -89,6 +143,8 @@ def run_migrations_online():
             )
 
             with context.begin_transaction():
+                if _should_bootstrap():
+                    _bootstrap_empty_database(connection)
                 context.run_migrations()
     except Exception as e:
         logger.error(f"Error during migrations: {e}")
@@ -0,0 +1,117 @@
+"""Squashed baseline schema for fresh databases
+
+Creates the schema as it stands after every migration up to and including
+BASELINE_REVISION in a single transaction. env.py uses it to bootstrap an
+empty database and then stamps BASELINE_REVISION, so only migrations added
+after the baseline are replayed. Existing databases keep using the regular
+revision chain in versions/.
+
+Keep this file in sync with the migrations it replaces; never edit it to
+include changes from revisions newer than BASELINE_REVISION.
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+
+# Last revision folded into this baseline
+BASELINE_REVISION = 'make_refresh_token_unique'
+
+
+def create_schema(connection):
+    """Create the baseline schema on an empty database."""
+    op = Operations(MigrationContext.configure(connection))
+    uuid = postgresql.UUID(as_uuid=False)
+
+    # Create users table
+    op.create_table(
+        'users',
+        sa.Column('id', uuid, nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('full_name', sa.String(length=255), nullable=True),
+        sa.Column('hashed_password', sa.String(length=255), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default=sa.text('TRUE')),
+        sa.Column('is_superuser', sa.Boolean(), nullable=False, server_default=sa.text('FALSE')),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text('NOW()')),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text('NOW()')),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('users_email_idx', 'users', ['email'], unique=True)
+
+    # Create notes table
+    op.create_table(
+        'notes',
+        sa.Column('id', uuid, nullable=False),
+        sa.Column('title', sa.String(length=255), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('source_url', sa.String(length=512), nullable=True),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('tags', sa.String(length=255), nullable=True),
+        sa.Column('is_summarized', sa.Boolean(), nullable=False, server_default=sa.text('FALSE')),
+        sa.Column('user_id', uuid, nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text('NOW()')),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text('NOW()')),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='notes_user_id_fkey', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('notes_user_id_idx', 'notes', ['user_id'], unique=False)
+
+    # Create reading_progress table
+    op.create_table(
+        'reading_progress',
+        sa.Column('id', uuid, nullable=False),
+        sa.Column('note_id', uuid, nullable=False),
+        sa.Column('user_id', uuid, nullable=False),
+        sa.Column('current_position', sa.Integer(), nullable=False, server_default=sa.text('0')),
+        sa.Column('total_length', sa.Integer(), nullable=False, server_default=sa.text('0')),
+        sa.Column('progress_percentage', sa.Float(), nullable=False, server_default=sa.text('0')),
+        sa.Column('last_read_at', sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text('NOW()')),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text('NOW()')),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text('NOW()')),
+        sa.ForeignKeyConstraint(['note_id'], ['notes.id'], name='reading_progress_note_id_fkey', ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='reading_progress_user_id_fkey', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('note_id', 'user_id', name='unique_user_note_progress')
+    )
+    op.create_index('reading_progress_note_id_idx', 'reading_progress', ['note_id'], unique=False)
+    op.create_index('reading_progress_user_id_idx', 'reading_progress', ['user_id'], unique=False)
+
+    # Create refresh_tokens table
+    op.create_table(
+        'refresh_tokens',
+        sa.Column('id', uuid, nullable=False),
+        sa.Column('token', sa.String(), nullable=False),
+        sa.Column('user_id', uuid, nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('NOW()'), nullable=False),
+        sa.Column('revoked', sa.Boolean(), server_default=sa.text('FALSE'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='refresh_tokens_user_id_fkey', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_refresh_tokens_token', 'refresh_tokens', ['token'], unique=True)
+    op.create_index(
+        'refresh_tokens_user_active_idx',
+        'refresh_tokens',
+        ['user_id'],
+        postgresql_where=sa.text('revoked = false')
+    )
+
+    # Create password_reset_tokens table
+    op.create_table(
+        'password_reset_tokens',
+        sa.Column('id', uuid, nullable=False),
+        sa.Column('user_email', sa.String(), nullable=False),
+        sa.Column('token_hash', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('used', sa.Boolean(), nullable=False, server_default=sa.text('FALSE')),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('NOW()')),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('password_reset_tokens_user_email_idx', 'password_reset_tokens', ['user_email'], unique=False)
+    op.create_index('password_reset_tokens_expires_at_idx', 'password_reset_tokens', ['expires_at'], unique=False)
+    op.create_index(
+        'password_reset_tokens_hash_active_idx',
+        'password_reset_tokens',
+        ['token_hash'],
+        postgresql_where=sa.text('used = false')
+    )
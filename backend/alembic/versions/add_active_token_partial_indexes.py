@@ -0,0 +1,36 @@
+"""Add partial indexes covering only live refresh and reset tokens
+
+Revision ID: add_active_token_partial_indexes
+Revises: convert_ids_to_uuid
+Create Date: 2026-10-15 10:30:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_active_token_partial_indexes'
+down_revision = 'convert_ids_to_uuid'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Index the working set of tokens without blocking writes"""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS refresh_tokens_user_active_idx "
+            "ON refresh_tokens (user_id) WHERE revoked = false"
+        )
+        # now() is not immutable, so expiry stays a filter rather than a predicate
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS password_reset_tokens_hash_active_idx "
+            "ON password_reset_tokens (token_hash) WHERE used = false"
+        )
+
+
+def downgrade():
+    """Remove the partial token indexes"""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS password_reset_tokens_hash_active_idx")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS refresh_tokens_user_active_idx")
@@ -0,0 +1,33 @@
+"""Denormalize user is_active onto refresh tokens
+
+Revision ID: add_refresh_token_user_is_active
+Revises: make_refresh_token_unique
+Create Date: 2026-10-15 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_refresh_token_user_is_active'
+down_revision = 'make_refresh_token_unique'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Store the owner's is_active flag on each refresh token"""
+    op.add_column(
+        'refresh_tokens',
+        sa.Column('user_is_active', sa.Boolean(), nullable=False, server_default=sa.text('TRUE'))
+    )
+    # Existing tokens take the current state of their user
+    op.execute(
+        "UPDATE refresh_tokens SET user_is_active = users.is_active "
+        "FROM users WHERE users.id = refresh_tokens.user_id AND users.is_active = false"
+    )
+
+
+def downgrade():
+    """Remove the denormalized is_active flag"""
+    op.drop_column('refresh_tokens', 'user_is_active')
@@ -0,0 +1,67 @@
+"""Convert id and foreign key columns to native uuid
+
+Revision ID: convert_ids_to_uuid
+Revises: add_password_reset_tokens
+Create Date: 2026-10-15 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'convert_ids_to_uuid'
+down_revision = 'add_password_reset_tokens'
+branch_labels = None
+depends_on = None
+
+
+# (table, column) pairs stored as text that only ever hold uuid4 strings
+UUID_COLUMNS = [
+    ('users', 'id'),
+    ('notes', 'id'),
+    ('notes', 'user_id'),
+    ('reading_progress', 'id'),
+    ('reading_progress', 'note_id'),
+    ('reading_progress', 'user_id'),
+    ('refresh_tokens', 'id'),
+    ('refresh_tokens', 'user_id'),
+    ('password_reset_tokens', 'id'),
+]
+
+# (constraint, table, column, referred table) - postgres default FK names
+FOREIGN_KEYS = [
+    ('notes_user_id_fkey', 'notes', 'user_id', 'users'),
+    ('reading_progress_note_id_fkey', 'reading_progress', 'note_id', 'notes'),
+    ('reading_progress_user_id_fkey', 'reading_progress', 'user_id', 'users'),
+    ('refresh_tokens_user_id_fkey', 'refresh_tokens', 'user_id', 'users'),
+]
+
+
+def _convert(type_, cast):
+    # Foreign keys must be dropped while both sides change type
+    for constraint, table, _, _ in FOREIGN_KEYS:
+        op.drop_constraint(constraint, table, type_='foreignkey')
+
+    for table, column in UUID_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=type_,
+            postgresql_using=f'{column}::{cast}'
+        )
+
+    for constraint, table, column, referred in FOREIGN_KEYS:
+        op.create_foreign_key(
+            constraint, table, referred, [column], ['id'], ondelete='CASCADE'
+        )
+
+
+def upgrade():
+    """Store ids as 16-byte uuid instead of 36+ byte text"""
+    _convert(postgresql.UUID(as_uuid=False), 'uuid')
+
+
+def downgrade():
+    """Revert ids to text"""
+    _convert(sa.String(), 'text')
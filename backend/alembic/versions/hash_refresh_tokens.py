@@ -0,0 +1,37 @@
+"""Store refresh tokens as sha256 digests
+
+Revision ID: hash_refresh_tokens
+Revises: add_refresh_token_user_is_active
+Create Date: 2026-10-15 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'hash_refresh_tokens'
+down_revision = 'add_refresh_token_user_is_active'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Replace the raw token column with a 32-byte sha256 digest"""
+    op.add_column('refresh_tokens', sa.Column('token_hash', sa.LargeBinary(), nullable=True))
+    op.execute("UPDATE refresh_tokens SET token_hash = sha256(convert_to(token, 'UTF8'))")
+    op.alter_column('refresh_tokens', 'token_hash', nullable=False)
+    op.create_index('ix_refresh_tokens_token_hash', 'refresh_tokens', ['token_hash'], unique=True)
+
+    op.drop_index('ix_refresh_tokens_token', table_name='refresh_tokens')
+    op.drop_column('refresh_tokens', 'token')
+
+
+def downgrade():
+    """Restore the raw token column"""
+    # Raw tokens cannot be recovered from their digests, so every session ends
+    op.execute("DELETE FROM refresh_tokens")
+    op.add_column('refresh_tokens', sa.Column('token', sa.String(), nullable=False))
+    op.create_index('ix_refresh_tokens_token', 'refresh_tokens', ['token'], unique=True)
+
+    op.drop_index('ix_refresh_tokens_token_hash', table_name='refresh_tokens')
+    op.drop_column('refresh_tokens', 'token_hash')
@@ -0,0 +1,51 @@
+"""Make the refresh token index unique
+
+Revision ID: make_refresh_token_unique
+Revises: add_active_token_partial_indexes
+Create Date: 2026-10-15 11:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'make_refresh_token_unique'
+down_revision = 'add_active_token_partial_indexes'
+branch_labels = None
+depends_on = None
+
+
+def _swap_token_index(unique):
+    # Build the replacement first so lookups never lose their index
+    with op.get_context().autocommit_block():
+        # A failed concurrent build leaves an INVALID index behind; clear it so
+        # the migration can be re-run
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_refresh_tokens_token_new")
+        op.create_index(
+            'ix_refresh_tokens_token_new',
+            'refresh_tokens',
+            ['token'],
+            unique=unique,
+            postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_refresh_tokens_token',
+            table_name='refresh_tokens',
+            postgresql_concurrently=True
+        )
+        op.execute("ALTER INDEX ix_refresh_tokens_token_new RENAME TO ix_refresh_tokens_token")
+
+
+def upgrade():
+    """Replace ix_refresh_tokens_token with a unique index"""
+    # Tokens minted for one user in the same second used to be identical;
+    # keep only the newest row for each token so the unique build succeeds
+    op.execute(
+        "DELETE FROM refresh_tokens a USING refresh_tokens b "
+        "WHERE a.token = b.token AND (a.created_at, a.id) < (b.created_at, b.id)"
+    )
+    _swap_token_index(unique=True)
+
+
+def downgrade():
+    """Restore the non-unique token index"""
+    _swap_token_index(unique=False)
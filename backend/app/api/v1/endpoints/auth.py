@@ -1,6 +1,8 @@
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, Body, BackgroundTasks
-from fastapi.security import OAuth2PasswordRequestForm
+from datetime import datetime
+from typing import Annotated
+from fastapi import APIRouter, HTTPException, status, Body, BackgroundTasks, Form, Request
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 import logging
 
 from app.api.v1.schemas.token import Token
@@ -11,28 +13,55 @@ from app.api.v1.schemas.password_reset import (
     ResetPasswordRequest, 
     ResetPasswordResponse
 )
-from app.services.user_service import UserService
+from app.services.user_service import UserService, UserServiceDep
 from app.services.email_service import email_service
+from app.workers.queue import enqueue_job
 from app.core.config import settings
-from app.core.security import create_access_token, verify_password, create_refresh_token, validate_refresh_token
-from app.db.async_base import AsyncDBSession
+from app.core.security import (
+    create_access_token,
+    access_token_expires,
+    ahash_password,
+    averify_password,
+    averify_dummy_password,
+    password_needs_rehash,
+    rate_limit,
+    create_refresh_token,
+    validate_refresh_token
+)
+from app.db.async_base import AsyncDBSession, get_async_db_session
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+async def _rehash_password(user_id: str, password: str) -> None:
+    """Upgrade a user's stored hash to the current scheme after login"""
+    # Runs after the response, when the request session is already closed
+    hashed_password = await ahash_password(password)
+    async with get_async_db_session() as session:
+        if await UserService(session).update_password_hash(user_id, hashed_password):
+            logger.info("Rehashed password for user %s", user_id)
+
+
 @router.post("/login", response_model=Token)
+@rate_limit(settings.AUTH_RATE_LIMIT)
 async def login_for_access_token(
-    session: AsyncDBSession, form_data: OAuth2PasswordRequestForm = Depends()
+    request: Request,
+    user_svc: UserServiceDep,
+    background_tasks: BackgroundTasks,
+    username: Annotated[str, Form()],
+    password: Annotated[str, Form()],
 ):
     """
     OAuth2 compatible token login, get an access token for future requests
     True async implementation with AsyncSession for maximum performance
     """
-    user_svc = UserService(session)
-    user = await user_svc.get_user_by_email(form_data.username)
+    user = await user_svc.get_login_credentials(username)
+    if not user:
+        # Match the cost of a wrong password so unknown emails aren't detectable
+        await averify_dummy_password(password)
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await averify_password(password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -44,19 +73,24 @@ async def login_for_access_token(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
         )
     
+    # Move bcrypt/PBKDF2 hashes to argon2id without delaying the response
+    if password_needs_rehash(user.hashed_password):
+        background_tasks.add_task(_rehash_password, user.id, password)
+    
     # Generate tokens
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    user_id = str(user.id)
     access_token = create_access_token(
-        subject=str(user.id), expires_delta=access_token_expires
+        subject=user_id, expires_delta=access_token_expires()
     )
     
     # Create refresh token
-    refresh_token = create_refresh_token(subject=str(user.id))
+    refresh_token = create_refresh_token(subject=user_id)
     
     # Store refresh token in database
-    await user_svc.create_refresh_token(user.id, refresh_token)
+    await user_svc.create_refresh_token(user_id, refresh_token)
     
-    logger.info(f"User logged in successfully: {user.email}")
+    logger.info("User logged in successfully: %s", user_id)
+    logger.debug("Login email for user %s: %s", user_id, user.email)
     return {
         "access_token": access_token, 
         "refresh_token": refresh_token,
@@ -66,76 +100,45 @@ async def login_for_access_token(
 
 @router.post("/refresh", response_model=Token)
 async def refresh_access_token(
-    session: AsyncDBSession, refresh_token: str = Body(..., embed=True)
+    user_svc: UserServiceDep, refresh_token: str = Body(..., embed=True)
 ):
     """
     Get a new access token using a refresh token
     True async implementation with AsyncSession for maximum performance
     """
-    user_svc = UserService(session)
-    
-    # Validate the refresh token from JWT perspective
-    try:
-        payload = validate_refresh_token(refresh_token)
-        user_id = payload.get("sub")
-        
-        # Verify token exists in database and is not revoked
-        db_token = await user_svc.get_refresh_token(refresh_token)
-        if not db_token:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or revoked refresh token",
-            )
-        
-        # Verify user exists and is active
-        user = await user_svc.get_user_by_id(user_id)
-        if not user or not user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid user or inactive user",
-            )
-        
-        # Revoke the used refresh token (token rotation)
-        await user_svc.revoke_refresh_token(refresh_token)
-        
-        # Generate new access token
-        access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            subject=str(user.id), expires_delta=access_token_expires
-        )
-        
-        # Generate new refresh token
-        new_refresh_token = create_refresh_token(subject=str(user.id))
-        
-        # Store new refresh token in database
-        await user_svc.create_refresh_token(user.id, new_refresh_token)
-        
-        logger.info(f"Token refreshed successfully for user: {user.email}")
-        return {
-            "access_token": access_token,
-            "refresh_token": new_refresh_token,
-            "token_type": "bearer"
-        }
+    # Validate the refresh token from JWT perspective; any decode failure is a 401
+    payload = validate_refresh_token(refresh_token)
+    user_id = payload.get("sub")
     
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        logger.error(f"Refresh token error: {e}")
+    # Revoke the used refresh token and store its replacement (token rotation).
+    # The rotation only matches a live, unexpired token of this active user,
+    # so it doubles as the database check in a single round trip.
+    new_refresh_token = create_refresh_token(subject=user_id)
+    if not await user_svc.rotate_refresh_token(refresh_token, user_id, new_refresh_token):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid refresh token",
-            headers={"WWW-Authenticate": "Bearer"},
+            detail="Invalid or revoked refresh token",
         )
+    
+    # Generate new access token
+    access_token = create_access_token(
+        subject=user_id, expires_delta=access_token_expires()
+    )
+    
+    logger.info("Token refreshed successfully for user: %s", user_id)
+    return {
+        "access_token": access_token,
+        "refresh_token": new_refresh_token,
+        "token_type": "bearer"
+    }
 
 
 @router.post("/logout", status_code=status.HTTP_200_OK)
-async def logout(session: AsyncDBSession, refresh_token: str = Body(..., embed=True)):
+async def logout(user_svc: UserServiceDep, refresh_token: str = Body(..., embed=True)):
     """
     Logout a user by revoking their refresh token
     True async implementation with AsyncSession for maximum performance
     """
-    user_svc = UserService(session)
-    
     # Revoke the refresh token
     revoked = await user_svc.revoke_refresh_token(refresh_token)
     if not revoked:
@@ -148,42 +151,47 @@ async def logout(session: AsyncDBSession, refresh_token: str = Body(..., embed=T
 
 
 @router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
-async def register_new_user(user_in: UserCreate, session: AsyncDBSession):
+async def register_new_user(user_in: UserCreate, user_svc: UserServiceDep):
     """
     Create new user
     True async implementation with AsyncSession for maximum performance
     """
-    user_svc = UserService(session)
-    
-    # Check if user already exists
-    existing_user = await user_svc.get_user_by_email(user_in.email)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="The user with this email already exists",
-        )
-    
     # Log if someone is trying to create a superuser
     if user_in.is_superuser:
-        logger.info(f"Creating superuser account for email: {user_in.email}")
+        logger.info("Creating superuser account")
+        logger.debug("Superuser account email: %s", user_in.email)
     
-    # Create new user through service layer
-    new_user = await user_svc.create_user(user_in)
-    if not new_user:
+    # Existence check and insert happen in a single round-trip
+    try:
+        new_user = await user_svc.create_user_if_not_exists(user_in)
+    except SQLAlchemyError:
+        logger.exception("Failed to create user")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create user"
         )
     
-    logger.info(f"New user registered successfully: {new_user.email}")
+    if not new_user:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "code": "USER_EXISTS",
+                "message": "The user with this email already exists",
+            },
+        )
+    
+    logger.info("New user registered successfully: %s", new_user.id)
+    logger.debug("Registered email for user %s: %s", new_user.id, new_user.email)
     return new_user
 
 
 @router.post("/forgot-password", response_model=ForgotPasswordResponse)
+@rate_limit(settings.AUTH_RATE_LIMIT)
 async def forgot_password(
-    request: ForgotPasswordRequest,
+    request: Request,
+    forgot_request: ForgotPasswordRequest,
     background_tasks: BackgroundTasks,
-    session: AsyncDBSession
+    user_svc: UserServiceDep
 ):
     """
     Request password reset - sends email with reset token
@@ -191,45 +199,41 @@ async def forgot_password(
     
     Security considerations:
     - Always returns success message (don't reveal if email exists)
-    - Rate limiting should be implemented at middleware level
+    - Rate limited per IP before any database work
     - Tokens expire in 1 hour
     - Old tokens are invalidated when new ones are created
     """
-    try:
-        user_svc = UserService(session)
-        email = request.email.lower().strip()
-        
-        # Try to create a reset token (returns None if user doesn't exist)
-        reset_token = await user_svc.create_password_reset_token(email)
-        
-        if reset_token:
-            # Send email in background
+    email = forgot_request.email
+    
+    # Try to create a reset token (returns None if user doesn't exist)
+    reset_token = await user_svc.create_password_reset_token(email)
+    
+    if reset_token:
+        # Hand the email to the job queue; send in-process if none is configured
+        if not await enqueue_job("send_password_reset_email", email, reset_token):
             background_tasks.add_task(
                 email_service.send_password_reset_email,
                 email,
                 reset_token
             )
-            logger.info(f"Password reset requested for existing user: {email}")
-        else:
-            logger.info(f"Password reset requested for non-existent user: {email}")
-        
-        # Always return success for security (don't reveal if email exists)
-        return ForgotPasswordResponse(
-            message="If an account with this email exists, you will receive password reset instructions."
-        )
-        
-    except Exception as e:
-        logger.error(f"Error in forgot_password: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to process password reset request. Please try again later."
-        )
+        logger.info("Password reset requested for existing user")
+        logger.debug("Password reset email: %s", email)
+    else:
+        logger.info("Password reset requested for non-existent user")
+        logger.debug("Password reset email: %s", email)
+    
+    # Always return success for security (don't reveal if email exists)
+    return ForgotPasswordResponse(
+        message="If an account with this email exists, you will receive password reset instructions."
+    )
 
 
 @router.post("/reset-password", response_model=ResetPasswordResponse)
+@rate_limit(settings.AUTH_RATE_LIMIT)
 async def reset_password(
-    request: ResetPasswordRequest,
-    session: AsyncDBSession
+    request: Request,
+    reset_request: ResetPasswordRequest,
+    user_svc: UserServiceDep
 ):
     """
     Reset password using token from email
@@ -240,90 +244,58 @@ async def reset_password(
     - Password is hashed before storage
     - All user sessions are invalidated for security
     """
-    try:
-        user_svc = UserService(session)
-        token = request.token.strip()
-        new_password = request.password
-        
-        # Validate password strength
-        if len(new_password) < 8:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Password must be at least 8 characters long"
-            )
-        
-        # Verify and use the reset token
-        success = await user_svc.verify_and_use_reset_token(token, new_password)
-        
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid or expired reset token"
-            )
-        
-        logger.info("Password reset successful")
-        return ResetPasswordResponse(
-            message="Password reset successful. You can now login with your new password."
-        )
-        
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        logger.error(f"Error in reset_password: {str(e)}")
+    # Token trimming and password length are enforced by ResetPasswordRequest
+    success = await user_svc.verify_and_use_reset_token(
+        reset_request.token, reset_request.password
+    )
+    
+    if not success:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to reset password. Please try again later."
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid or expired reset token"
         )
+    
+    logger.info("Password reset successful")
+    return ResetPasswordResponse(
+        message="Password reset successful. You can now login with your new password."
+    )
 
 
 @router.delete("/cleanup-expired-tokens")
-async def cleanup_expired_tokens(session: AsyncDBSession):
+async def cleanup_expired_tokens(user_svc: UserServiceDep):
     """
     Admin endpoint to cleanup expired tokens
     True async implementation with AsyncSession for maximum performance
     This should typically be called via a scheduled job
     """
-    try:
-        user_svc = UserService(session)
-        
-        # Cleanup expired refresh tokens
-        refresh_count = await user_svc.cleanup_expired_refresh_tokens()
-        
-        # Cleanup expired reset tokens
-        reset_count = await user_svc.cleanup_expired_reset_tokens()
-        
-        logger.info(f"Token cleanup completed: {refresh_count} refresh, {reset_count} reset tokens removed")
-        return {
-            "message": "Token cleanup completed successfully",
-            "expired_refresh_tokens_removed": refresh_count,
-            "expired_reset_tokens_removed": reset_count
-        }
-        
-    except Exception as e:
-        logger.error(f"Error in cleanup_expired_tokens: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to cleanup expired tokens"
-        )
+    # Cleanup expired refresh and reset tokens in one round trip
+    refresh_count, reset_count = await user_svc.cleanup_expired_tokens()
+    
+    logger.info(
+        "Token cleanup completed: %s refresh, %s reset tokens removed",
+        refresh_count, reset_count
+    )
+    return {
+        "message": "Token cleanup completed successfully",
+        "expired_refresh_tokens_removed": refresh_count,
+        "expired_reset_tokens_removed": reset_count
+    }
 
 
 @router.get("/health")
 async def auth_health_check(session: AsyncDBSession):
     """
     Health check endpoint for authentication service
-    Tests async database connectivity and basic operations
+    Tests async database connectivity with a bare SELECT 1
     """
     try:
-        user_svc = UserService(session)
-        
-        # Test basic database connectivity
-        users = await user_svc.get_users(limit=1)
+        await session.execute(text("SELECT 1"))
         
         return {
             "status": "healthy",
             "database": "connected",
             "async_operations": "functional",
-            "timestamp": logger.info("Auth health check passed")
+            "timestamp": datetime.utcnow().isoformat()
         }
         
     except Exception as e:
@@ -331,4 +303,4 @@ async def auth_health_check(session: AsyncDBSession):
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Authentication service unhealthy"
-        ) 
\ No newline at end of file
+        )
@@ -1,31 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+import asyncio
+import hashlib
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from typing import List, Optional
 from uuid import UUID
 
 from app.core.security import get_current_active_superuser, get_current_user
 from app.api.v1.schemas.user import UserRead, UserUpdate
-from app.services.user_service import UserService
-from app.core.security import get_password_hash
-from app.db.async_base import AsyncDBSession
+from app.services.user_service import UserServiceDep
+from app.core.security import ahash_password
 from app.db.models import User
 
 router = APIRouter()
 
 
-@router.get("/me", response_model=UserRead)
-async def read_user_me(current_user: User = Depends(get_current_user)):
+def _user_etag(user: User) -> str:
+    """ETag for a user's representation; changes whenever the row is updated"""
+    digest = hashlib.blake2b(f"{user.id}:{user.updated_at}".encode(), digest_size=8).hexdigest()
+    return f'"{digest}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match already names this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+@router.get(
+    "/me",
+    response_model=UserRead,
+    responses={status.HTTP_304_NOT_MODIFIED: {"description": "Not modified"}},
+)
+async def read_user_me(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+):
     """
     Get current user
     No database call needed since user is already authenticated
+    Answers 304 without a body when the client's ETag is still current
     """
+    cache_headers = {
+        "ETag": _user_etag(current_user),
+        "Cache-Control": "private, max-age=0, must-revalidate",
+        "Vary": "Authorization",
+    }
+    if _etag_matches(request, cache_headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    
+    response.headers.update(cache_headers)
     # Convert User model to UserRead schema
-    return UserRead.from_orm(current_user)
+    return UserRead.model_validate(current_user)
 
 
 @router.patch("/me", response_model=UserRead)
 async def update_user_me(
     user_in: UserUpdate,
-    db: AsyncDBSession,
+    user_svc: UserServiceDep,
     current_user: User = Depends(get_current_user),
 ):
     """
@@ -37,63 +71,78 @@ async def update_user_me(
     2. Only the provided fields are updated, not the entire resource
     3. It follows HTTP semantics where PATCH is for partial updates
     """
-    # Extract fields to update
-    update_data = user_in.dict(exclude_unset=True)
+    # Extract fields to update, ignoring ones that already hold the sent value
+    update_data = {
+        key: value for key, value in user_in.model_dump(exclude_unset=True).items()
+        if key == "password" or getattr(current_user, key, None) != value
+    }
     
-    # Handle password separately
-    if "password" in update_data:
-        update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+    # Nothing to change - skip the database entirely
+    if not update_data:
+        return UserRead.model_validate(current_user)
     
-    # Create user service
-    user_svc = UserService(db)
+    # Handle password separately; hash on the password pool while the
+    # email check below runs against the database
+    hash_task = None
+    if "password" in update_data:
+        hash_task = asyncio.create_task(ahash_password(update_data.pop("password")))
     
     # Check if email already exists for another user
     if "email" in update_data:
         existing_user = await user_svc.get_user_by_email(update_data["email"])
         if existing_user and existing_user.id != current_user.id:
+            if hash_task:
+                hash_task.cancel()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered",
             )
     
-    # Only update if there are changes
-    if update_data:
-        # Pass the dictionary directly
-        updated_user = await user_svc.update_user(UUID(current_user.id), update_data)
-        if updated_user:
-            return UserRead.from_orm(updated_user)
+    if hash_task:
+        update_data["hashed_password"] = await hash_task
     
-    # If no changes or update failed, return current user
-    return UserRead.from_orm(current_user)
+    # Pass the dictionary directly
+    updated_user = await user_svc.update_user(current_user.id, update_data)
+    if updated_user:
+        return UserRead.model_validate(updated_user)
+    
+    # If the update failed, return current user
+    return UserRead.model_validate(current_user)
 
 
 @router.get("", response_model=List[UserRead])
 async def read_users(
-    db: AsyncDBSession,
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    user_svc: UserServiceDep,
+    after: Optional[UUID] = None,
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(100, ge=1, le=1000),
     current_user: User = Depends(get_current_active_superuser),
 ):
     """
     Retrieve all users - superuser only
     True async implementation with AsyncSession for maximum performance
+    
+    Users are ordered by id. A full page sets the X-Next-Cursor header;
+    pass it back as `after` to fetch the next page.
     """
-    user_svc = UserService(db)
-    users = await user_svc.get_users(skip, limit)
-    return [UserRead.from_orm(user) for user in users]
+    users = await user_svc.get_users(skip, limit, after=after)
+    if len(users) == limit:
+        response.headers["X-Next-Cursor"] = str(users[-1].id)
+    # response_model serializes the rows directly; no separate validation pass
+    return users
 
 
 @router.get("/{user_id}", response_model=UserRead)
 async def read_user_by_id(
     user_id: UUID,
-    db: AsyncDBSession,
+    user_svc: UserServiceDep,
     current_user: User = Depends(get_current_active_superuser),
 ):
     """
     Get a specific user by id - superuser only
     True async implementation with AsyncSession for maximum performance
     """
-    user_svc = UserService(db)
     user = await user_svc.get_user_by_id(user_id)
     
     if not user:
@@ -101,13 +150,13 @@ async def read_user_by_id(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
     
-    return UserRead.from_orm(user)
+    return UserRead.model_validate(user)
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
     user_id: UUID,
-    db: AsyncDBSession,
+    user_svc: UserServiceDep,
     current_user: User = Depends(get_current_active_superuser),
 ):
     """
@@ -115,8 +164,6 @@ async def delete_user(
     True async implementation with AsyncSession for maximum performance
     Includes cascade deletion of associated data
     """
-    user_svc = UserService(db)
-    
     # Prevent self-deletion
     if str(user_id) == current_user.id:
         raise HTTPException(
@@ -1,13 +1,19 @@
 """
 Pydantic schemas for password reset functionality
 """
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, field_validator
 
 
 class ForgotPasswordRequest(BaseModel):
     """Schema for forgot password request"""
     email: EmailStr = Field(..., description="Email address to send reset link to")
 
+    @field_validator("email", mode="before")
+    @classmethod
+    def normalize_email(cls, v):
+        """Reset tokens are keyed by the lowercased, trimmed email"""
+        return v.strip().lower() if isinstance(v, str) else v
+
 
 class ForgotPasswordResponse(BaseModel):
     """Schema for forgot password response"""
@@ -19,6 +25,12 @@ class ResetPasswordRequest(BaseModel):
     token: str = Field(..., min_length=1, description="Password reset token from email")
     password: str = Field(..., min_length=8, description="New password (minimum 8 characters)")
 
+    @field_validator("token", mode="before")
+    @classmethod
+    def strip_token(cls, v):
+        """Tokens pasted from emails often carry surrounding whitespace"""
+        return v.strip() if isinstance(v, str) else v
+
 
 class ResetPasswordResponse(BaseModel):
     """Schema for reset password response"""
@@ -1,3 +1,4 @@
+from functools import cached_property
 from pydantic_settings import BaseSettings
 from typing import Optional, List
 
@@ -9,6 +10,9 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     SECRET_KEY: str = "YOUR_SECRET_KEY"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440
+    # Spread access token lifetimes by +/- this percentage so tokens issued
+    # together don't all expire (and refresh) at the same moment
+    ACCESS_TOKEN_EXPIRE_JITTER_PCT: float = 10
     REFRESH_TOKEN_EXPIRE_DAYS: int = 30
     OPENAI_MODEL: str = "gpt-4o"
     OPENAI_API_KEY: str
@@ -24,6 +28,15 @@ class Settings(BaseSettings):
     DB_PORT: str
     DB_DATABASE: str
     DB_SSLMODE: Optional[str] = "require"
+    # Set when connecting through PgBouncer in transaction pooling mode, which
+    # can't keep server-side prepared statements between transactions
+    DB_PGBOUNCER: bool = False
+
+    # Optional Redis cache (e.g. redis://localhost:6379/0); caching is off when unset
+    REDIS_URL: Optional[str] = None
+
+    # Per-IP limit on login and password reset endpoints
+    AUTH_RATE_LIMIT: str = "10/minute"
     
     # Email Configuration for Password Recovery
     # For custom domains on Zoho, try both smtp.zoho.com and smtppro.zoho.com
@@ -38,13 +51,19 @@ class Settings(BaseSettings):
     SMTP_USE_TLS: bool = True
     SMTP_USE_SSL: bool = False
 
-    @property
+    # Settings are fixed after startup, so derived values are built once
+    @cached_property
     def DATABASE_URL(self) -> str:
         if self.DB_SSLMODE:
             return f"postgresql://{self.DB_USERNAME}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_DATABASE}?sslmode={self.DB_SSLMODE}"
         else:
             return f"postgresql://{self.DB_USERNAME}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_DATABASE}"
 
+    @cached_property
+    def ASYNC_DATABASE_URL(self) -> str:
+        # asyncpg rejects sslmode in the URL; SSL goes through connect_args instead
+        return f"postgresql+asyncpg://{self.DB_USERNAME}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_DATABASE}"
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -53,7 +72,7 @@ class Settings(BaseSettings):
     def get_settings(self):
         return self
 
-    @property
+    @cached_property
     def fastapi_kwargs(self):
         return {
             "title": self.PROJECT_NAME,
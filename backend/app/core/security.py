@@ -1,14 +1,21 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
+import asyncio
+import functools
+import hmac
 import logging
 import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import sha256
 from uuid import UUID
 
-from jose import jwt
+from cachetools import TLRUCache
+import jwt
 from passlib.context import CryptContext
+from passlib.hash import argon2
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from fastapi import HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer
 
@@ -21,16 +28,50 @@ from slowapi.util import get_remote_address
 # Create a logger
 logger = logging.getLogger(__name__)
 
-# Configure a more robust password context that can fall back to multiple schemes
-# This ensures it works even if bcrypt has issues
+# Configure a more robust password context that can fall back to multiple schemes.
+# New hashes use argon2id; bcrypt and PBKDF2 hashes still verify and are marked
+# deprecated so they get rehashed on the next successful login.
 try:
-    # Try to use bcrypt first
-    pwd_context = CryptContext(schemes=["bcrypt", "pbkdf2_sha256"], deprecated="auto")
-    logger.info("Using bcrypt for password hashing")
+    # Try to use argon2id first
+    if not argon2.has_backend():
+        raise RuntimeError("argon2-cffi is not installed")
+    pwd_context = CryptContext(
+        schemes=["argon2", "bcrypt", "pbkdf2_sha256"],
+        deprecated="auto",
+        argon2__type="ID",
+        argon2__time_cost=2,
+        argon2__memory_cost=19456,
+        argon2__parallelism=1,
+    )
+    logger.info("Using argon2id for password hashing")
 except Exception as e:
-    # Fall back to PBKDF2 if bcrypt has issues
-    logger.warning(f"Bcrypt error: {e}, falling back to PBKDF2")
-    pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+    # Fall back to bcrypt if argon2 is unavailable
+    logger.warning(f"Argon2 error: {e}, falling back to bcrypt")
+    pwd_context = CryptContext(schemes=["bcrypt", "pbkdf2_sha256"], deprecated="auto")
+
+
+@functools.cache
+def _dummy_password_hash() -> str:
+    """
+    Hash verified against when a login email is unknown, so those requests
+    cost the same KDF time as a wrong password and don't leak which emails exist.
+    Built on first use rather than at import to keep a full KDF run off startup.
+    """
+    return pwd_context.hash("dummy-password-for-timing")
+
+
+def _verify_dummy_password(plain_password: str) -> bool:
+    """Verify against the dummy hash; runs on the password pool"""
+    return verify_password(plain_password, _dummy_password_hash())
+
+
+# Dedicated pool for password hashing so the KDF never runs on the event loop.
+# argon2 and bcrypt release the GIL while hashing, so threads give real parallelism
+# across cores without the pickling/fork overhead of a process pool.
+_password_pool = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1,
+    thread_name_prefix="password-hash"
+)
 
 # OAuth2 scheme for extracting tokens
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
@@ -38,17 +79,65 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 # JWT algorithm
 ALGORITHM = "HS256"
 
-# For backward compatibility, create a simple rate limiter
+# HS256 signing key, encoded once; the token payload caches below skip
+# repeat verifications entirely
+_jwt_key = settings.SECRET_KEY.encode()
+
+# Every token we issue carries these; reject any that doesn't
+_JWT_DECODE_OPTIONS = {"require": ["exp", "sub"]}
+
+# Maximum time a decoded refresh token payload is reused without re-verifying
+REFRESH_TOKEN_CACHE_SECONDS = 30
+
+
+def _refresh_token_cache_ttu(_key, payload, now):
+    """Expire cached payloads after the cache window or at token expiry, whichever is first"""
+    remaining = payload["exp"] - time.time()
+    return now + max(0, min(REFRESH_TOKEN_CACHE_SECONDS, remaining))
+
+
+# Verified refresh token payloads keyed by sha256(token)
+_refresh_token_cache: TLRUCache = TLRUCache(maxsize=10_000, ttu=_refresh_token_cache_ttu)
+
+# Maximum time a decoded access token payload is reused without re-verifying
+ACCESS_TOKEN_CACHE_SECONDS = 30
+
+
+def _access_token_cache_ttu(_key, payload, now):
+    """Expire cached payloads after the cache window or at token expiry, whichever is first"""
+    remaining = payload["exp"] - time.time()
+    return now + max(0, min(ACCESS_TOKEN_CACHE_SECONDS, remaining))
+
+
+# Verified access token payloads keyed by sha256(token)
+_access_token_cache: TLRUCache = TLRUCache(maxsize=10_000, ttu=_access_token_cache_ttu)
+
+# Per-IP rate limiter; counters live in Redis when configured so limits hold
+# across workers, with an in-memory fallback if Redis is unreachable
 try:
     rate_limiter = Limiter(
         key_func=get_remote_address, 
-        default_limits=["100/hour"]
+        default_limits=["100/hour"],
+        storage_uri=settings.REDIS_URL or "memory://",
+        key_prefix="rl",
+        in_memory_fallback_enabled=True,
+        swallow_errors=True
     )
 except Exception as e:
     logger.warning(f"Rate limiter setup failed: {e}")
     rate_limiter = None
 
 
+def rate_limit(limit: str):
+    """
+    Decorate an endpoint with a per-IP rate limit.
+    The endpoint must accept a `request: Request` argument.
+    """
+    if rate_limiter is None:
+        return lambda endpoint: endpoint
+    return rate_limiter.limit(limit)
+
+
 def hash_password(password: str) -> str:
     """
     Hash a password for storing with error handling.
@@ -74,10 +163,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
         # Handle fallback hash format if it was used
         if hashed_password.startswith("$fallback$"):
-            _, salt_hex, hash_hex = hashed_password.split("$", 3)
+            _, _, salt_hex, hash_hex = hashed_password.split("$", 3)
             salt = bytes.fromhex(salt_hex)
             hash_obj = sha256(plain_password.encode() + salt)
-            return hash_obj.hexdigest() == hash_hex
+            # Constant-time comparison so timing doesn't reveal matching bytes
+            return hmac.compare_digest(hash_obj.digest(), bytes.fromhex(hash_hex))
         
         # Use passlib for normal verification
         return pwd_context.verify(plain_password, hashed_password)
@@ -86,17 +176,74 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         return False
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Check whether a stored hash uses a deprecated scheme or outdated parameters.
+    """
+    if hashed_password.startswith("$fallback$"):
+        return True
+    try:
+        return pwd_context.needs_update(hashed_password)
+    except Exception as e:
+        logger.error(f"Password rehash check error: {e}")
+        return False
+
+
+async def ahash_password(password: str) -> str:
+    """
+    Hash a password on the password pool without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_pool, hash_password, password)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a password on the password pool without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_pool, verify_password, plain_password, hashed_password
+    )
+
+
+async def averify_dummy_password(plain_password: str) -> None:
+    """
+    Spend one password verification on the dummy hash for unknown users.
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_password_pool, _verify_dummy_password, plain_password)
+
+
+_jitter_random = secrets.SystemRandom()
+
+# Token lifetimes read once at import; settings don't change at runtime
+_ACCESS_TTL_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+_ACCESS_TTL_SPREAD = _ACCESS_TTL_MINUTES * settings.ACCESS_TOKEN_EXPIRE_JITTER_PCT / 100
+_REFRESH_TTL = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+
+
+def access_token_expires() -> timedelta:
+    """
+    Access token lifetime with random jitter of ACCESS_TOKEN_EXPIRE_JITTER_PCT.
+    """
+    return timedelta(
+        minutes=_ACCESS_TTL_MINUTES
+        + _jitter_random.uniform(-_ACCESS_TTL_SPREAD, _ACCESS_TTL_SPREAD)
+    )
+
+
 def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT access token with the given subject and expiration time.
     """
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = datetime.now(timezone.utc) + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.now(timezone.utc) + access_token_expires()
     
     to_encode = {"exp": expire, "sub": str(subject), "type": "access"}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _jwt_key, algorithm=ALGORITHM)
     return encoded_jwt
 
 
@@ -104,37 +251,55 @@ def create_refresh_token(subject: str) -> str:
     """
     Create a JWT refresh token with longer expiration time.
     """
-    expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode = {"exp": expire, "sub": str(subject), "type": "refresh"}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
+    expire = datetime.now(timezone.utc) + _REFRESH_TTL
+    # The random jti keeps tokens issued to one user in the same second distinct
+    to_encode = {
+        "exp": expire,
+        "sub": str(subject),
+        "type": "refresh",
+        "jti": secrets.token_urlsafe(16),
+    }
+    encoded_jwt = jwt.encode(to_encode, _jwt_key, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 def validate_refresh_token(token: str) -> dict:
     """
     Validate and decode a refresh token.
-    Raises HTTPException if invalid.
+    Verified payloads are cached briefly by token hash so repeated refreshes
+    skip the signature check. Raises HTTPException if invalid.
     """
+    cache_key = sha256(token.encode()).digest()
+    cached = _refresh_token_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(
+            token, _jwt_key, algorithms=[ALGORITHM], options=_JWT_DECODE_OPTIONS
+        )
         if payload.get("type") != "refresh":
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token type",
-            )
-        return payload
+            raise jwt.InvalidTokenError("Invalid token type")
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token has expired",
         )
-    except Exception as e:
+    except jwt.PyJWTError as e:
         logger.error(f"Refresh token validation error: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token",
         )
 
+    _refresh_token_cache[cache_key] = payload
+    return dict(payload)
+
+
+def invalidate_refresh_token_cache(token: str) -> None:
+    """Forget a cached refresh token payload, e.g. after revocation"""
+    _refresh_token_cache.pop(sha256(token.encode()).digest(), None)
+
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
@@ -174,7 +339,14 @@ async def get_user_from_token(token: str, db: AsyncSession) -> User:
     True async implementation for maximum performance.
     """
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+        # Repeated requests with the same bearer token skip signature verification
+        cache_key = sha256(token.encode()).digest()
+        payload = _access_token_cache.get(cache_key)
+        if payload is None:
+            payload = jwt.decode(
+                token, _jwt_key, algorithms=[ALGORITHM], options=_JWT_DECODE_OPTIONS
+            )
+            _access_token_cache[cache_key] = payload
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(
@@ -182,11 +354,9 @@ async def get_user_from_token(token: str, db: AsyncSession) -> User:
                 detail="Invalid or expired token",
             )
         
-        # Use async database operation
-        result = await db.execute(
-            select(User).filter(User.id == user_id)
-        )
-        user = result.scalar_one_or_none()
+        # Primary-key lookup through the session's identity map, so later
+        # get_user_by_id calls in the same request don't query again
+        user = await db.get(User, user_id)
         
         if user is None:
             raise HTTPException(
@@ -2,6 +2,7 @@
 Async database configuration for maximum performance with AsyncPG
 """
 import logging
+import uuid
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
@@ -13,45 +14,10 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-# Convert DATABASE_URL to async format for AsyncPG
+# Async database URL for AsyncPG
 def get_async_database_url() -> str:
-    """Convert sync database URL to async format for AsyncPG"""
-    database_url = settings.DATABASE_URL
-    
-    # Replace postgresql:// with postgresql+asyncpg:// for async
-    if database_url.startswith("postgresql://"):
-        async_url = database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
-    elif database_url.startswith("postgres://"):
-        async_url = database_url.replace("postgres://", "postgresql+asyncpg://", 1)
-    else:
-        # Already async format
-        async_url = database_url
-    
-    # AsyncPG doesn't accept 'sslmode' in URL - remove it
-    # SSL will be handled by connection parameters instead
-    if "sslmode=" in async_url:
-        # Remove sslmode parameter from URL
-        import urllib.parse
-        parsed = urllib.parse.urlparse(async_url)
-        query_params = urllib.parse.parse_qs(parsed.query)
-        
-        # Remove sslmode from query parameters
-        if 'sslmode' in query_params:
-            del query_params['sslmode']
-        
-        # Rebuild URL without sslmode
-        new_query = urllib.parse.urlencode(query_params, doseq=True)
-        async_url = urllib.parse.urlunparse((
-            parsed.scheme,
-            parsed.netloc,
-            parsed.path,
-            parsed.params,
-            new_query,
-            parsed.fragment
-        ))
-    
-    logger.info("Configured async database URL with AsyncPG driver (SSL handled separately)")
-    return async_url
+    """Database URL for the AsyncPG driver (SSL handled separately)"""
+    return settings.ASYNC_DATABASE_URL
 
 # Create async SQLAlchemy engine
 try:
@@ -71,16 +37,32 @@ try:
         elif ssl_mode == 'allow':
             connect_args['ssl'] = False
     
+    # PgBouncer in transaction mode may hand each transaction a different
+    # server connection, so statements must not be prepared by name
+    if settings.DB_PGBOUNCER:
+        connect_args['statement_cache_size'] = 0
+        connect_args['prepared_statement_cache_size'] = 0
+        connect_args['prepared_statement_name_func'] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    
+    # Name the connections for pg_stat_activity, and skip JIT compilation,
+    # which only adds planning time to short OLTP queries like ours.
+    # PgBouncer rejects unknown startup parameters such as jit.
+    connect_args['server_settings'] = {'application_name': 'mindmarks'}
+    if not settings.DB_PGBOUNCER:
+        connect_args['server_settings']['jit'] = 'off'
+    
     # For local development, try without SSL first if connection fails
-    is_local_dev = 'localhost' in get_async_database_url() or '127.0.0.1' in get_async_database_url()
+    async_database_url = get_async_database_url()
+    is_local_dev = 'localhost' in async_database_url or '127.0.0.1' in async_database_url
     
     try:
         async_engine = create_async_engine(
-            get_async_database_url(),
+            async_database_url,
             # Performance optimizations for async
             pool_size=20,          # Larger pool for async concurrency
             max_overflow=30,       # Allow burst connections
             pool_pre_ping=True,    # Test connections before use
+            pool_use_lifo=True,    # Reuse the most recently returned connection so a hot few stay warm
             pool_recycle=3600,     # Recycle connections hourly
             echo=False,            # Set to True for SQL debugging
             future=True,           # Use SQLAlchemy 2.0 style
@@ -93,10 +75,11 @@ try:
             logger.warning(f"SSL connection failed for local dev, retrying without SSL: {ssl_error}")
             connect_args['ssl'] = False
             async_engine = create_async_engine(
-                get_async_database_url(),
+                async_database_url,
                 pool_size=20,
                 max_overflow=30,
                 pool_pre_ping=True,
+                pool_use_lifo=True,
                 pool_recycle=3600,
                 echo=False,
                 future=True,
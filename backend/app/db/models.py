@@ -8,13 +8,15 @@ from sqlalchemy import (
     Text,
     Boolean,
     ForeignKey,
+    LargeBinary,
     TIMESTAMP,
     Float,
     UniqueConstraint,
     Index,
-    DateTime
+    DateTime,
+    text
 )
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -29,7 +31,7 @@ Base = declarative_base()
 class User(Base):
     __tablename__ = "users"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
     email = Column(String, unique=True, index=True, nullable=False)
     full_name = Column(String, nullable=True)
     hashed_password = Column(String, nullable=False)
@@ -51,14 +53,14 @@ class User(Base):
 class Note(Base):
     __tablename__ = "notes"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
     title = Column(String(255), nullable=False)
     content = Column(Text, nullable=False)
     source_url = Column(String(512))
     summary = Column(Text)
     tags = Column(String(255))
     is_summarized = Column(Boolean, default=False, nullable=False)
-    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(UUID(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
@@ -74,9 +76,9 @@ class Note(Base):
 class ReadingProgress(Base):
     __tablename__ = "reading_progress"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    note_id = Column(String, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
-    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    id = Column(UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    note_id = Column(UUID(as_uuid=False), ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(UUID(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     current_position = Column(Integer, default=0, nullable=False)
     total_length = Column(Integer, default=0, nullable=False)
     progress_percentage = Column(Float, default=0.0, nullable=False)
@@ -98,21 +100,32 @@ class ReadingProgress(Base):
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    token = Column(String, nullable=False, index=True)
-    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    id = Column(UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    token_hash = Column(LargeBinary, nullable=False, unique=True, index=True)  # sha256 of the JWT
+    user_id = Column(UUID(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     expires_at = Column(DateTime, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     revoked = Column(Boolean, default=False)
+    # Copy of users.is_active so refresh doesn't need a second lookup
+    user_is_active = Column(Boolean, nullable=False, default=True, server_default=text('true'))
     
     # Relationship to user
     user = relationship("User", back_populates="refresh_tokens")
+    
+    __table_args__ = (
+        Index('refresh_tokens_user_active_idx', 'user_id', postgresql_where=text('revoked = false')),
+    )
+    
+    @staticmethod
+    def hash_token(token: str) -> bytes:
+        """Hash a raw refresh token the way it is stored"""
+        return hashlib.sha256(token.encode()).digest()
 
 
 class PasswordResetToken(Base):
     __tablename__ = "password_reset_tokens"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_email = Column(String, index=True, nullable=False)
     token_hash = Column(String, nullable=False)  # Store hashed token for security
     expires_at = Column(DateTime, nullable=False)
@@ -122,13 +135,19 @@ class PasswordResetToken(Base):
     __table_args__ = (
         Index('password_reset_tokens_user_email_idx', 'user_email'),
         Index('password_reset_tokens_expires_at_idx', 'expires_at'),
+        Index('password_reset_tokens_hash_active_idx', 'token_hash', postgresql_where=text('used = false')),
     )
     
+    @staticmethod
+    def hash_token(token: str) -> str:
+        """Hash a raw reset token the way it is stored"""
+        return hashlib.sha256(token.encode()).hexdigest()
+    
     @classmethod
     def create_token(cls, user_email: str, expires_in_hours: int = 1):
         """Create a new password reset token"""
         token = secrets.token_urlsafe(32)
-        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        token_hash = cls.hash_token(token)
         
         return cls(
             user_email=user_email.lower(),
@@ -138,7 +157,7 @@ class PasswordResetToken(Base):
     
     def verify_token(self, token: str) -> bool:
         """Verify if the provided token matches this record"""
-        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        token_hash = self.hash_token(token)
         return (
             self.token_hash == token_hash and
             not self.used and
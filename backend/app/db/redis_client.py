@@ -0,0 +1,37 @@
+"""
+Optional shared Redis client, used by the email bloom filter
+"""
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_redis = None
+
+
+def get_redis():
+    """
+    Return the shared async Redis client, or None when REDIS_URL is not set.
+    The client is created lazily and reused across requests.
+    """
+    global _redis
+    if _redis is None and settings.REDIS_URL:
+        # Imported lazily so deployments without Redis don't need the package
+        import redis.asyncio as redis
+
+        _redis = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        logger.info("Redis client configured")
+    return _redis
+
+
+async def close_redis() -> None:
+    """
+    Close the shared Redis client.
+    Call this during application shutdown.
+    """
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+        logger.info("Redis connections closed")
@@ -1,11 +1,19 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from slowapi import _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
 
 from app.api.v1 import api_router as api_v1_router
 from app.core.config import settings
+from app.core.security import rate_limiter
 from app.db.async_base import init_async_db, close_async_db
+from app.db.redis_client import close_redis
+from app.services import email_bloom
+from app.workers.queue import close_arq_pool
 
 logger = logging.getLogger(__name__)
 
@@ -17,19 +25,26 @@ async def lifespan(app: FastAPI):
     Handles startup and shutdown of async database connections.
     """
     # Startup
+    seed_task = None
     try:
         logger.info("Starting up Mindmarks API with async database...")
         await init_async_db()
         logger.info("Async database initialized successfully")
+        # Seed the login bloom filter without delaying startup
+        seed_task = asyncio.create_task(email_bloom.seed_from_db())
         yield
     except Exception as e:
         logger.error(f"Failed to initialize async database: {e}")
         raise
     finally:
         # Shutdown
+        if seed_task is not None:
+            seed_task.cancel()
         try:
             logger.info("Shutting down async database connections...")
             await close_async_db()
+            await close_redis()
+            await close_arq_pool()
             logger.info("Async database connections closed successfully")
         except Exception as e:
             logger.error(f"Error during database shutdown: {e}")
@@ -45,6 +60,7 @@ def create_application() -> FastAPI:
         openapi_url="/api/openapi.json",
         docs_url="/docs",
         redoc_url="/redoc",
+        default_response_class=ORJSONResponse,  # orjson for every route, not just /api/v1
         lifespan=lifespan  # Enable async lifespan management
     )
 
@@ -56,8 +72,14 @@ def create_application() -> FastAPI:
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            expose_headers=["X-Next-Cursor"],  # Pagination cursor for GET /users
         )
 
+    # Rate limits on auth endpoints answer with 429 instead of a server error
+    if rate_limiter is not None:
+        app.state.limiter = rate_limiter
+        app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
     # Include API routers with version prefixes
     app.include_router(api_v1_router, prefix="/api/v1")
 
@@ -0,0 +1,138 @@
+"""
+Redis-backed bloom filter of registered emails
+
+Lets login reject emails that are definitely not registered without a
+Postgres round trip. The filter lives in a Redis bitmap so every worker sees
+users registered by any other worker; a per-process filter would produce
+false negatives and lock real users out.
+
+The filter only answers "definitely not registered" once it has been fully
+seeded. The ready flag is a bit inside the same bitmap, so if Redis evicts or
+loses the key the filter turns itself off instead of rejecting everyone.
+A failed write deletes the key and bumps a generation counter; a seed that
+sees the counter move does not set the ready bit over a partial bitmap.
+Deleted users stay in the filter; they are harmless false positives.
+"""
+import hashlib
+import logging
+from typing import List
+
+from sqlalchemy import select
+
+from app.db.async_base import get_async_db_session
+from app.db.models import User
+from app.db.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+BLOOM_KEY = "bloom:users"
+# Incremented whenever the bitmap is dropped
+BLOOM_GENERATION_KEY = "bloom:users:generation"
+# 16 Mbit (2 MiB) with 13 hashes keeps the false positive rate near 1e-4
+# up to roughly 850k users
+BLOOM_BITS = 1 << 24
+BLOOM_HASHES = 13
+# Set once seeding has finished
+READY_BIT = BLOOM_BITS
+
+SEED_BATCH_SIZE = 1000
+
+
+def _positions(email: str) -> List[int]:
+    """Bit positions for an email using double hashing over one sha256"""
+    digest = hashlib.sha256(email.encode()).digest()
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:16], "big") | 1
+    return [(h1 + i * h2) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+
+async def might_exist(email: str) -> bool:
+    """
+    False only if the email is definitely not registered.
+    Returns True when Redis is not configured, unreachable, or not seeded.
+    """
+    redis = get_redis()
+    if redis is None:
+        return True
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.getbit(BLOOM_KEY, READY_BIT)
+        for position in _positions(email):
+            pipe.getbit(BLOOM_KEY, position)
+        ready, *bits = await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Redis error checking email bloom filter: {e}")
+        return True
+    return not ready or all(bits)
+
+
+async def _set_bits(redis, emails) -> None:
+    """Set the filter bits for each email in one pipelined round trip"""
+    pipe = redis.pipeline(transaction=False)
+    for email in emails:
+        for position in _positions(email):
+            pipe.setbit(BLOOM_KEY, position, 1)
+    await pipe.execute()
+
+
+async def add_emails(*emails: str) -> None:
+    """Record registered emails in the filter"""
+    redis = get_redis()
+    if redis is None or not emails:
+        return
+    try:
+        await _set_bits(redis, emails)
+    except Exception as e:
+        logger.error(f"Redis error updating email bloom filter, disabling it: {e}")
+        # A missing email would lock that user out, so drop the whole filter;
+        # it is rebuilt by the next seed_from_db. Bumping the generation stops
+        # a seed already in progress from marking the partial bitmap ready.
+        try:
+            pipe = redis.pipeline(transaction=True)
+            pipe.incr(BLOOM_GENERATION_KEY)
+            pipe.delete(BLOOM_KEY)
+            await pipe.execute()
+        except Exception:
+            pass
+
+
+async def seed_from_db() -> None:
+    """
+    Populate the filter from the users table if it is not seeded yet.
+    Safe to run from several workers at once; setting bits is idempotent.
+    The ready bit is only set if the filter was not dropped mid-seed.
+    """
+    redis = get_redis()
+    if redis is None:
+        return
+    # Imported lazily so deployments without Redis don't need the package
+    from redis.exceptions import WatchError
+
+    try:
+        if await redis.getbit(BLOOM_KEY, READY_BIT):
+            return
+        generation = await redis.get(BLOOM_GENERATION_KEY)
+
+        count = 0
+        async with get_async_db_session() as session:
+            result = await session.stream_scalars(
+                select(User.email).execution_options(yield_per=SEED_BATCH_SIZE)
+            )
+            async for batch in result.partitions(SEED_BATCH_SIZE):
+                await _set_bits(redis, batch)
+                count += len(batch)
+
+        # Mark the filter ready only if nothing dropped it while seeding
+        async with redis.pipeline(transaction=True) as pipe:
+            await pipe.watch(BLOOM_GENERATION_KEY)
+            if await pipe.get(BLOOM_GENERATION_KEY) != generation:
+                logger.warning("Email bloom filter was dropped during seeding, not marking it ready")
+                return
+            pipe.multi()
+            pipe.setbit(BLOOM_KEY, READY_BIT, 1)
+            await pipe.execute()
+        logger.info(f"Email bloom filter seeded with {count} users")
+    except WatchError:
+        logger.warning("Email bloom filter was dropped during seeding, not marking it ready")
+    except Exception as e:
+        logger.error(f"Failed to seed email bloom filter: {e}")
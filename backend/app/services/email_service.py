@@ -153,7 +153,8 @@ class EmailService:
                         server.login(self.smtp_username, self.smtp_password)
                         server.send_message(msg)
                     
-                    logger.info(f"Password reset email sent to {to_email} via {smtp_server}")
+                    logger.info("Password reset email sent via %s", smtp_server)
+                    logger.debug("Password reset email recipient: %s", to_email)
                     return True
                     
                 except smtplib.SMTPAuthenticationError as e:
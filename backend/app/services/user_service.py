@@ -1,19 +1,55 @@
 import logging
 import uuid
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Union
+from typing import Annotated, Dict, List, Optional, Tuple, Union
 from uuid import UUID
+from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import or_, and_, select, update, delete
+from sqlalchemy import or_, and_, select, update, delete, insert, literal, true, false, bindparam, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.db.models import User, RefreshToken, PasswordResetToken
-from app.core.security import get_password_hash, verify_password
+from app.db.async_base import AsyncDBSession
+from app.services import email_bloom
+from app.core.security import (
+    ahash_password,
+    verify_password,
+    invalidate_refresh_token_cache
+)
 from app.api.v1.schemas.user import UserCreate, UserUpdate
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class LoginCredentials:
+    """Immutable, session-free snapshot of the user fields the login path needs"""
+    id: str
+    email: str
+    hashed_password: str
+    is_active: bool
+
+
+# Column names update_user may assign; unknown keys are ignored
+_USER_COLUMNS = frozenset(User.__table__.columns.keys())
+
+# Hot lookups are built once at import time and reused with bound parameters,
+# so each call skips constructing the select() and goes straight to the
+# compiled-statement cache
+_USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+_LOGIN_CREDENTIALS_BY_EMAIL = (
+    select(User.id, User.email, User.hashed_password, User.is_active)
+    .where(User.email == bindparam("email"))
+)
+_LIVE_REFRESH_TOKEN_BY_HASH = select(RefreshToken).where(
+    RefreshToken.token_hash == bindparam("token_hash"),
+    RefreshToken.revoked == False,
+    RefreshToken.expires_at > bindparam("now")
+)
+
+
 class UserService:
     """
     async UserService using AsyncSession for maximum performance.
@@ -24,10 +60,8 @@ class UserService:
     async def get_user_by_id(self, user_id: UUID) -> Optional[User]:
         """Get a user by ID - True async operation"""
         try:
-            result = await self.db.execute(
-                select(User).filter(User.id == str(user_id))
-            )
-            return result.scalar_one_or_none()
+            # Served from the identity map when the request already loaded this user
+            return await self.db.get(User, str(user_id))
         except Exception as e:
             logger.error(f"Error getting user by ID {user_id}: {e}")
             return None
@@ -35,72 +69,119 @@ class UserService:
     async def get_user_by_email(self, email: str) -> Optional[User]:
         """Get a user by email - True async operation"""
         try:
-            result = await self.db.execute(
-                select(User).filter(User.email == email)
-            )
+            result = await self.db.execute(_USER_BY_EMAIL, {"email": email})
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error(f"Error getting user by email {email}: {e}")
             return None
 
-    async def create_user(self, user_in: UserCreate) -> Optional[User]:
-        """Create a new user - True async operation"""
+    async def get_login_credentials(self, email: str) -> Optional[LoginCredentials]:
+        """Get the credentials needed to authenticate a login - True async operation"""
+        # Emails the bloom filter has never seen skip the database entirely
+        if not await email_bloom.might_exist(email):
+            return None
+        
         try:
-            # Check if email is already registered
-            existing_user = await self.get_user_by_email(user_in.email)
-            if existing_user:
-                return None
-            
-            hashed_password = get_password_hash(user_in.password)
-            user = User(
+            # Select only the needed columns - no ORM instance or identity-map work
+            result = await self.db.execute(_LOGIN_CREDENTIALS_BY_EMAIL, {"email": email})
+            row = result.first()
+        except Exception as e:
+            logger.error(f"Error getting login credentials for {email}: {e}")
+            return None
+        
+        if row is None:
+            return None
+        
+        return LoginCredentials(*row)
+
+    async def create_user_if_not_exists(self, user_in: UserCreate) -> Optional[User]:
+        """
+        Create a new user in a single INSERT ... ON CONFLICT (email) DO NOTHING round-trip.
+        Returns None when the email is already registered; database errors are re-raised.
+        """
+        hashed_password = await ahash_password(user_in.password)
+        stmt = (
+            pg_insert(User)
+            .values(
                 id=str(uuid.uuid4()),
                 email=user_in.email,
                 full_name=user_in.full_name,
                 is_active=user_in.is_active,
                 is_superuser=user_in.is_superuser,
-                hashed_password=hashed_password
+                hashed_password=hashed_password,
+                # Server time; the model's Python-side utcnow default is naive
+                created_at=func.now(),
+                updated_at=func.now()
             )
-            
-            self.db.add(user)
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(User)
+        )
+        # Register the email with the bloom filter before it can log in
+        await email_bloom.add_emails(user_in.email)
+        
+        try:
+            result = await self.db.execute(stmt)
+            user = result.scalar_one_or_none()
             await self.db.commit()
-            await self.db.refresh(user)
-            
-            logger.info(f"User created successfully: {user.email}")
-            return user
-            
         except Exception as e:
             await self.db.rollback()
             logger.error(f"Error creating user: {e}")
-            return None
+            raise
+        
+        if user:
+            logger.info("User created successfully: %s", user.id)
+            logger.debug("Created user %s with email %s", user.id, user.email)
+        return user
 
-    async def update_user(self, user_id: UUID, user_in: Union[UserUpdate, Dict]) -> Optional[User]:
+    async def update_user(self, user_id: Union[UUID, str], user_in: Union[UserUpdate, Dict]) -> Optional[User]:
         """Update a user - True async operation"""
         try:
             user = await self.get_user_by_id(user_id)
             if not user:
                 return None
+            previous_email = user.email
             
             # Update user fields
-            if hasattr(user_in, 'dict'):
-                update_data = user_in.dict(exclude_unset=True)
+            if isinstance(user_in, UserUpdate):
+                update_data = user_in.model_dump(exclude_unset=True)
             else:
                 update_data = user_in
             
             # Handle password separately to hash it
             if "password" in update_data:
-                update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+                update_data["hashed_password"] = await ahash_password(update_data.pop("password"))
+            
+            # Only fields that actually differ are written; a no-op update
+            # returns without touching the database again
+            changes = {
+                key: value for key, value in update_data.items()
+                if key in _USER_COLUMNS and getattr(user, key) != value
+            }
+            if not changes:
+                return user
             
             # Update timestamp
-            update_data["updated_at"] = datetime.utcnow()
+            changes["updated_at"] = datetime.utcnow()
+            
+            for key, value in changes.items():
+                setattr(user, key, value)
             
-            for key, value in update_data.items():
-                if hasattr(user, key):
-                    setattr(user, key, value)
+            if user.email != previous_email:
+                await email_bloom.add_emails(user.email)
+            
+            # Keep the copy of is_active on refresh tokens in step
+            if "is_active" in changes:
+                await self.db.execute(
+                    update(RefreshToken)
+                    .filter(RefreshToken.user_id == str(user_id))
+                    .values(user_is_active=changes["is_active"])
+                )
             
             await self.db.commit()
             await self.db.refresh(user)
             
-            logger.info(f"User updated successfully: {user.email}")
+            logger.info("User updated successfully: %s", user.id)
+            logger.debug("Updated user %s has email %s", user.id, user.email)
             return user
             
         except Exception as e:
@@ -108,6 +189,24 @@ class UserService:
             logger.error(f"Error updating user {user_id}: {e}")
             return None
 
+    async def update_password_hash(self, user_id: UUID, hashed_password: str) -> bool:
+        """Replace a user's stored password hash - True async operation"""
+        try:
+            result = await self.db.execute(
+                update(User)
+                .where(User.id == str(user_id))
+                .values(hashed_password=hashed_password, updated_at=func.now())
+                .returning(User.id)
+            )
+            updated_id = result.scalar_one_or_none()
+            await self.db.commit()
+            return updated_id is not None
+            
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"Error updating password hash for user {user_id}: {e}")
+            return False
+
     async def delete_user(self, user_id: UUID) -> bool:
         """Delete a user and associated data - True async operation"""
         try:
@@ -139,18 +238,30 @@ class UserService:
             logger.error(f"Failed to delete user {user_id}: {e}")
             return False
 
-    async def get_users(self, skip: int = 0, limit: int = 100) -> List[User]:
-        """Get all users with pagination - True async operation"""
+    async def get_users(
+        self, skip: int = 0, limit: int = 100, after: Optional[UUID] = None
+    ) -> List[User]:
+        """
+        Get users ordered by id - True async operation
+        Pass the last id of the previous page as `after` for keyset pagination,
+        which reads only the requested page off the primary key index.
+        `skip` is kept for older callers and costs a scan of the skipped rows.
+        """
         try:
-            result = await self.db.execute(
-                select(User).offset(skip).limit(limit)
-            )
+            stmt = select(User).order_by(User.id).limit(limit)
+            if after is not None:
+                stmt = stmt.where(User.id > str(after))
+            if skip:
+                stmt = stmt.offset(skip)
+            result = await self.db.execute(stmt)
             return result.scalars().all()
         except Exception as e:
             logger.error(f"Error getting users: {e}")
             return []
         
-    async def create_refresh_token(self, user_id: UUID, token: str) -> Optional[RefreshToken]:
+    async def create_refresh_token(
+        self, user_id: UUID, token: str, user_is_active: bool = True
+    ) -> Optional[RefreshToken]:
         """Store a refresh token in the database - True async operation"""
         try:
             # Calculate expiration date
@@ -159,9 +270,10 @@ class UserService:
             # Create token record
             refresh_token = RefreshToken(
                 id=str(uuid.uuid4()),
-                token=token,
+                token_hash=RefreshToken.hash_token(token),
                 user_id=str(user_id),
-                expires_at=expires_at
+                expires_at=expires_at,
+                user_is_active=user_is_active
             )
             
             # Save to database
@@ -180,33 +292,82 @@ class UserService:
         """Get a refresh token by its token string - True async operation"""
         try:
             result = await self.db.execute(
-                select(RefreshToken).filter(
-                    RefreshToken.token == token,
-                    RefreshToken.revoked == False,
-                    RefreshToken.expires_at > datetime.utcnow()
-                )
+                _LIVE_REFRESH_TOKEN_BY_HASH,
+                {"token_hash": RefreshToken.hash_token(token), "now": datetime.utcnow()}
             )
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error(f"Error getting refresh token: {e}")
             return None
-    
+
+    async def rotate_refresh_token(
+        self, old_token: str, user_id: UUID, new_token: str
+    ) -> Optional[RefreshToken]:
+        """
+        Revoke a live refresh token and store its replacement in one statement.
+        Returns None if the old token is unknown, expired, already revoked
+        (e.g. by a concurrent refresh), or belongs to another or inactive user.
+        """
+        old_token_hash = RefreshToken.hash_token(old_token)
+        try:
+            now = datetime.utcnow()
+            columns = RefreshToken.__table__.c
+            revoked = (
+                update(RefreshToken)
+                .filter(
+                    RefreshToken.token_hash == old_token_hash,
+                    RefreshToken.user_id == str(user_id),
+                    RefreshToken.revoked == False,
+                    RefreshToken.expires_at > now,
+                    RefreshToken.user_is_active == True
+                )
+                .values(revoked=True)
+                .returning(RefreshToken.user_id)
+                .cte("revoked")
+            )
+            result = await self.db.execute(
+                insert(RefreshToken)
+                .from_select(
+                    ["id", "token_hash", "user_id", "expires_at", "created_at", "revoked", "user_is_active"],
+                    select(
+                        literal(str(uuid.uuid4()), columns.id.type),
+                        literal(RefreshToken.hash_token(new_token), columns.token_hash.type),
+                        revoked.c.user_id,
+                        literal(now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS), columns.expires_at.type),
+                        literal(now, columns.created_at.type),
+                        false(),
+                        true()
+                    )
+                )
+                .returning(RefreshToken)
+            )
+            refresh_token = result.scalar_one_or_none()
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"Error rotating refresh token: {e}")
+            return None
+
+        invalidate_refresh_token_cache(old_token)
+        return refresh_token
+
     async def revoke_refresh_token(self, token: str) -> bool:
         """Revoke a refresh token - True async operation"""
         try:
             result = await self.db.execute(
                 update(RefreshToken)
-                .filter(RefreshToken.token == token)
+                .filter(RefreshToken.token_hash == RefreshToken.hash_token(token))
                 .values(revoked=True)
             )
             await self.db.commit()
+            invalidate_refresh_token_cache(token)
             return result.rowcount > 0
         except Exception as e:
             await self.db.rollback()
             logger.error(f"Error revoking refresh token: {e}")
             return False
     
-    async def revoke_all_user_refresh_tokens(self, user_id: UUID) -> int:
+    async def revoke_all_user_refresh_tokens(self, user_id: Union[UUID, str]) -> int:
         """Revoke all refresh tokens for a user - True async operation"""
         try:
             result = await self.db.execute(
@@ -226,24 +387,6 @@ class UserService:
             logger.error(f"Error revoking user refresh tokens: {e}")
             return 0
 
-    async def cleanup_expired_refresh_tokens(self) -> int:
-        """Clean up expired refresh tokens - True async operation"""
-        try:
-            result = await self.db.execute(
-                delete(RefreshToken).filter(
-                    RefreshToken.expires_at <= datetime.utcnow()
-                )
-            )
-            await self.db.commit()
-            deleted_count = result.rowcount
-            logger.info(f"Cleaned up {deleted_count} expired refresh tokens")
-            return deleted_count
-            
-        except Exception as e:
-            await self.db.rollback()
-            logger.error(f"Failed to cleanup expired refresh tokens: {e}")
-            return 0
-
     async def create_password_reset_token(self, email: str) -> Optional[str]:
         """Create a password reset token for a user - True async operation"""
         try:
@@ -269,7 +412,8 @@ class UserService:
             self.db.add(reset_record)
             await self.db.commit()
             
-            logger.info(f"Password reset token created for user: {email}")
+            logger.info("Password reset token created for user: %s", user.id)
+            logger.debug("Password reset token email: %s", email)
             return reset_token
             
         except Exception as e:
@@ -280,10 +424,11 @@ class UserService:
     async def verify_and_use_reset_token(self, token: str, new_password: str) -> bool:
         """Verify and use a password reset token - True async operation"""
         try:
-            # Find valid reset token
+            # Find valid reset token by its hash (served by the partial index)
             result = await self.db.execute(
                 select(PasswordResetToken).filter(
                     and_(
+                        PasswordResetToken.token_hash == PasswordResetToken.hash_token(token),
                         PasswordResetToken.used == False,
                         PasswordResetToken.expires_at > datetime.utcnow()
                     )
@@ -307,17 +452,18 @@ class UserService:
                 return False
             
             # Update password
-            user.hashed_password = get_password_hash(new_password)
+            user.hashed_password = await ahash_password(new_password)
             user.updated_at = datetime.utcnow()
             
             # Mark token as used
             reset_record.used = True
             
             # Revoke all refresh tokens for security
-            await self.revoke_all_user_refresh_tokens(UUID(user.id))
+            await self.revoke_all_user_refresh_tokens(user.id)
             
             await self.db.commit()
-            logger.info(f"Password reset successful for user: {user.email}")
+            logger.info("Password reset successful for user: %s", user.id)
+            logger.debug("Password reset email: %s", user.email)
             return True
             
         except Exception as e:
@@ -325,23 +471,53 @@ class UserService:
             logger.error(f"Failed to reset password: {e}")
             return False
 
-    async def cleanup_expired_reset_tokens(self) -> int:
-        """Clean up expired password reset tokens - True async operation"""
+    async def cleanup_expired_tokens(self) -> Tuple[int, int]:
+        """
+        Delete expired refresh tokens and expired/used reset tokens in one statement.
+        Returns (refresh tokens removed, reset tokens removed).
+        """
         try:
-            result = await self.db.execute(
-                delete(PasswordResetToken).filter(
+            now = datetime.utcnow()
+            expired_refresh = (
+                delete(RefreshToken)
+                .filter(RefreshToken.expires_at <= now)
+                .returning(RefreshToken.id)
+                .cte("expired_refresh_tokens")
+            )
+            expired_reset = (
+                delete(PasswordResetToken)
+                .filter(
                     or_(
-                        PasswordResetToken.expires_at <= datetime.utcnow(),
+                        PasswordResetToken.expires_at <= now,
                         PasswordResetToken.used == True
                     )
                 )
+                .returning(PasswordResetToken.id)
+                .cte("expired_reset_tokens")
+            )
+            result = await self.db.execute(
+                select(
+                    select(func.count()).select_from(expired_refresh).scalar_subquery(),
+                    select(func.count()).select_from(expired_reset).scalar_subquery()
+                )
             )
+            refresh_count, reset_count = result.one()
             await self.db.commit()
-            deleted_count = result.rowcount
-            logger.info(f"Cleaned up {deleted_count} expired/used password reset tokens")
-            return deleted_count
+            return refresh_count, reset_count
             
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Failed to cleanup expired reset tokens: {e}")
-            return 0 
\ No newline at end of file
+            logger.error(f"Failed to cleanup expired tokens: {e}")
+            return 0, 0
+
+
+def get_user_service(session: AsyncDBSession) -> UserService:
+    """
+    Dependency injection for FastAPI endpoints.
+    Provides a UserService bound to the request's AsyncSession.
+    """
+    return UserService(session)
+
+
+# Type alias for dependency injection
+UserServiceDep = Annotated[UserService, Depends(get_user_service)]
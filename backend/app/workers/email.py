@@ -0,0 +1,28 @@
+"""
+arq worker for outgoing email
+
+Run with: arq app.workers.email.WorkerSettings
+"""
+import logging
+
+from arq import Retry
+from arq.connections import RedisSettings
+
+from app.core.config import settings
+from app.services.email_service import email_service
+
+logger = logging.getLogger(__name__)
+
+
+async def send_password_reset_email(ctx, to_email: str, reset_token: str) -> None:
+    """Send a password reset email, retrying with backoff if SMTP fails"""
+    if not await email_service.send_password_reset_email(to_email, reset_token):
+        logger.warning("Password reset email failed (try %s)", ctx["job_try"])
+        logger.debug("Failed password reset email recipient: %s", to_email)
+        raise Retry(defer=ctx["job_try"] * 30)
+
+
+class WorkerSettings:
+    functions = [send_password_reset_email]
+    redis_settings = RedisSettings.from_dsn(settings.REDIS_URL or "redis://localhost:6379")
+    max_tries = 5
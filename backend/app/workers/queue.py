@@ -0,0 +1,62 @@
+"""
+Optional arq job queue backed by Redis
+"""
+import asyncio
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_arq_pool = None
+_arq_pool_lock = asyncio.Lock()
+
+
+async def get_arq_pool():
+    """
+    Return the shared arq pool, or None when REDIS_URL is not set.
+    The pool is created lazily on first use.
+    """
+    global _arq_pool
+    if _arq_pool is None and settings.REDIS_URL:
+        async with _arq_pool_lock:
+            if _arq_pool is None:
+                # Imported lazily so deployments without Redis don't need arq
+                from arq import create_pool
+                from arq.connections import RedisSettings
+
+                redis_settings = RedisSettings.from_dsn(settings.REDIS_URL)
+                # Fail fast on the request path; callers fall back to in-process work
+                redis_settings.conn_retries = 0
+                _arq_pool = await create_pool(redis_settings)
+                logger.info("arq job queue configured")
+    return _arq_pool
+
+
+async def enqueue_job(function: str, *args) -> bool:
+    """
+    Queue a job for the arq worker.
+    Returns False if no queue is configured or Redis is unreachable,
+    so callers can fall back to running the work in-process.
+    """
+    try:
+        pool = await get_arq_pool()
+        if pool is None:
+            return False
+        await pool.enqueue_job(function, *args)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to enqueue {function}: {e}")
+        return False
+
+
+async def close_arq_pool() -> None:
+    """
+    Close the shared arq pool.
+    Call this during application shutdown.
+    """
+    global _arq_pool
+    if _arq_pool is not None:
+        await _arq_pool.aclose()
+        _arq_pool = None
+        logger.info("arq job queue closed")
@@ -95,7 +95,11 @@ async function apiRequest<T>(
       const errorData = await response.json();
       
       // Handle different API error response formats
-      if (errorData.detail) {
+      if (errorData.detail && typeof errorData.detail === 'object' && errorData.detail.code) {
+        // Structured FastAPI format: {"detail": {"code": "ERROR_CODE", "message": "text"}}
+        errorMessage = errorData.detail.message ?? errorData.detail.code;
+        errorCode = errorData.detail.code;
+      } else if (errorData.detail) {
         // FastAPI format: {"detail": "message"}
         errorMessage = errorData.detail;
       } else if (errorData.message) {